@@ -229,7 +229,7 @@ class LightweightMMM:
     """
     default_priors = {
         **models._get_default_priors(),
-        **models._get_transform_default_priors()[self.model_name]
+        **models._get_transform_defaults()[self.model_name].as_mapping()
     }
     # Checking that the key is contained in custom_priors has already been done
     # at this point in the fit function.
@@ -15,7 +15,7 @@
 """Media transformations for accounting for lagging or media effects."""
 
 import functools
-from typing import Union
+from typing import Optional, Union
 
 import jax
 import jax.numpy as jnp
@@ -59,7 +59,7 @@ def calculate_seasonality(
   return (season_matrix * gamma_seasonality).sum(axis=2).sum(axis=1)
 
 
-@jax.jit
+@functools.partial(jax.jit, static_argnames=("normalise",))
 def adstock(data: jnp.ndarray,
             lag_weight: float = .9,
             normalise: bool = True) -> jnp.ndarray:
@@ -72,7 +72,9 @@ def adstock(data: jnp.ndarray,
     data: Input array.
     lag_weight: lag_weight effect of the adstock function. Default is 0.9.
     normalise: Whether to normalise the output value. This normalization will
-      divide the output values by (1 / (1 - lag_weight)).
+      divide the output values by (1 / (1 - lag_weight)). It is a static
+      argument so the normalization is fused with the rest of the computation
+      instead of going through a conditional.
 
   Returns:
     The adstock output of the input array.
@@ -87,11 +89,9 @@ def adstock(data: jnp.ndarray,
   _, adstock_values = jax.lax.scan(
       f=adstock_internal, init=data[0, ...], xs=data[1:, ...])
   adstock_values = jnp.concatenate([jnp.array([data[0, ...]]), adstock_values])
-  return jax.lax.cond(
-      normalise,
-      lambda adstock_values: adstock_values / (1. / (1 - lag_weight)),
-      lambda adstock_values: adstock_values,
-      operand=adstock_values)
+  if normalise:
+    adstock_values = adstock_values / (1. / (1 - lag_weight))
+  return adstock_values
 
 
 @jax.jit
@@ -147,15 +147,17 @@ def _carryover_convolve(data: jnp.ndarray,
   Returns:
     The result values from convolving the data and the weights with padding.
   """
-  window = jnp.concatenate([jnp.zeros(number_lags - 1), weights])
+  window = jnp.concatenate(
+      [jnp.zeros(number_lags - 1, dtype=weights.dtype), weights])
   return jax.scipy.signal.convolve(data, window, mode="same") / weights.sum()
 
 
-@functools.partial(jax.jit, static_argnames=("number_lags",))
+@functools.partial(jax.jit, static_argnames=("number_lags", "dtype"))
 def carryover(data: jnp.ndarray,
               ad_effect_retention_rate: jnp.ndarray,
               peak_effect_delay: jnp.ndarray,
-              number_lags: int = 13) -> jnp.ndarray:
+              number_lags: int = 13,
+              dtype: Optional[jnp.dtype] = None) -> jnp.ndarray:
   """Calculates media carryover.
 
   More details about this function can be found in:
@@ -170,6 +172,9 @@ def carryover(data: jnp.ndarray,
       Default is 1.
     number_lags: Number of lags to include in the carryover calculation. Default
       is 13.
+    dtype: Dtype to compute the carryover weights in (eg. jnp.bfloat16 to
+      keep the convolution in bfloat16). By default the weights have the
+      promoted dtype of the parameters.
 
   Returns:
     The carryover values for the given data with the given parameters.
@@ -185,6 +190,8 @@ def carryover(data: jnp.ndarray,
     convolve_func = jax.vmap(
         fun=_carryover_convolve, in_axes=(2, None, None), out_axes=2)
   weights = ad_effect_retention_rate**((lags_arange - peak_effect_delay)**2)
+  if dtype is not None:
+    weights = weights.astype(dtype)
   return convolve_func(data, weights, number_lags)
 
 
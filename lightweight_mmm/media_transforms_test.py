@@ -120,6 +120,43 @@ class MediaTransformsTest(parameterized.TestCase):
 
     self.assertEqual(generated_output.shape, data.shape)
 
+  def test_adstock_normalise_scales_output_by_one_minus_lag_weight(self):
+    data = jnp.arange(50, dtype=jnp.float32).reshape((10, 5))
+    lag_weight = jnp.full(5, 0.3)
+
+    normalised_output = media_transforms.adstock(
+        data=data, lag_weight=lag_weight, normalise=True)
+    output = media_transforms.adstock(
+        data=data, lag_weight=lag_weight, normalise=False)
+
+    np.testing.assert_allclose(
+        normalised_output, output * (1 - lag_weight), rtol=1e-6)
+
+  def test_carryover_keeps_bfloat16_data_in_bfloat16(self):
+    data = jnp.ones((10, 5), dtype=jnp.bfloat16)
+    ad_effect_retention_rate = jnp.full(5, 0.5, dtype=jnp.bfloat16)
+    peak_effect_delay = jnp.full(5, 0.5, dtype=jnp.bfloat16)
+
+    generated_output = media_transforms.carryover(
+        data=data,
+        ad_effect_retention_rate=ad_effect_retention_rate,
+        peak_effect_delay=peak_effect_delay,
+        dtype=jnp.bfloat16)
+
+    self.assertEqual(generated_output.dtype, jnp.bfloat16)
+
+  def test_carryover_keeps_weights_in_parameters_dtype_by_default(self):
+    data = jnp.ones((10, 5), dtype=jnp.bfloat16)
+    ad_effect_retention_rate = jnp.full(5, 0.5, dtype=jnp.float32)
+    peak_effect_delay = jnp.full(5, 0.5, dtype=jnp.float32)
+
+    generated_output = media_transforms.carryover(
+        data=data,
+        ad_effect_retention_rate=ad_effect_retention_rate,
+        peak_effect_delay=peak_effect_delay)
+
+    self.assertEqual(generated_output.dtype, jnp.float32)
+
   def test_apply_exponent_safe_produces_correct_shape(self):
     data = jnp.arange(50).reshape((10, 5))
     exponent = jnp.full(5, 0.5)
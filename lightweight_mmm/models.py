@@ -21,16 +21,20 @@ three different models.
   - Hill-Adstock
   - Carryover
 """
+import dataclasses
+import functools
 import sys
+import types
 #  pylint: disable=g-import-not-at-top
 if sys.version_info >= (3, 8):
   from typing import Protocol
 else:
   from typing_extensions import Protocol
 
-from typing import Any, Dict, Mapping, MutableMapping, Optional, Sequence, Union
+from typing import (Any, Callable, Dict, Mapping, MutableMapping, Optional,
+                    Sequence, Tuple, Union)
 
-import immutabledict
+import jax
 import jax.numpy as jnp
 import numpyro
 from numpyro import distributions as dist
@@ -81,7 +85,7 @@ _SLOPE = "slope"
 _AD_EFFECT_RETENTION_RATE = "ad_effect_retention_rate"
 _PEAK_EFFECT_DELAY = "peak_effect_delay"
 
-TRANSFORM_PRIORS_NAMES = immutabledict.immutabledict({
+TRANSFORM_PRIORS_NAMES = types.MappingProxyType({
     "carryover":
         frozenset((_AD_EFFECT_RETENTION_RATE, _PEAK_EFFECT_DELAY, _EXPONENT)),
     "adstock":
@@ -94,62 +98,330 @@ TRANSFORM_PRIORS_NAMES = immutabledict.immutabledict({
 
 GEO_ONLY_PRIORS = frozenset((_COEF_SEASONALITY,))
 
+_CHANNEL_PLATE = "channel_plate"
+_GEO_PLATE = "geo_plate"
+_CHANNEL_MEDIA_PLATE = "channel_media_plate"
+_GEO_MEDIA_PLATE = "geo_media_plate"
+_GAMMA_SEASONALITY_SIN_COS_PLATE = f"{_GAMMA_SEASONALITY}_sin_cos_plate"
+_GAMMA_SEASONALITY_PLATE = f"{_GAMMA_SEASONALITY}_plate"
+_WEEKDAY_PLATE = f"{_WEEKDAY}_plate"
+_SEASONALITY_PLATE = "seasonality_plate"
+
+_PRECISION_DTYPES = types.MappingProxyType({
+    "fp32": jnp.float32,
+    "bf16": jnp.bfloat16,
+})
+
 
+@functools.lru_cache(maxsize=1)
 def _get_default_priors() -> Mapping[str, Prior]:
   # Since JAX cannot be called before absl.app.run in tests we get default
-  # priors from a function.
-  return immutabledict.immutabledict({
-      _INTERCEPT: dist.HalfNormal(scale=2.),
-      _COEF_TREND: dist.Normal(loc=0., scale=1.),
-      _EXPO_TREND: dist.Uniform(low=0.5, high=1.5),
-      _SIGMA: dist.Gamma(concentration=1., rate=1.),
-      _GAMMA_SEASONALITY: dist.Normal(loc=0., scale=1.),
-      _WEEKDAY: dist.Normal(loc=0., scale=.5),
-      _COEF_EXTRA_FEATURES: dist.Normal(loc=0., scale=1.),
-      _COEF_SEASONALITY: dist.HalfNormal(scale=.5)
-  })
-
-
-def _get_transform_default_priors() -> Mapping[str, Prior]:
+  # priors from a function. The result is cached so the distributions are only
+  # built once instead of on every trace of the model. The first call can
+  # happen while tracing the model (eg. under jax.jit), so the distributions
+  # are built with concrete arrays to not leak tracers through the cache.
+  with jax.ensure_compile_time_eval():
+    return types.MappingProxyType({
+        _INTERCEPT: dist.HalfNormal(scale=2.),
+        _COEF_TREND: dist.Normal(loc=0., scale=1.),
+        _EXPO_TREND: dist.Uniform(low=0.5, high=1.5),
+        _SIGMA: dist.Gamma(concentration=1., rate=1.),
+        _GAMMA_SEASONALITY: dist.Normal(loc=0., scale=1.),
+        _WEEKDAY: dist.Normal(loc=0., scale=.5),
+        _COEF_EXTRA_FEATURES: dist.Normal(loc=0., scale=1.),
+        _COEF_SEASONALITY: dist.HalfNormal(scale=.5)
+    })
+
+
+@dataclasses.dataclass(frozen=True)
+class _CarryoverDefaults:
+  """Default priors of transform_carryover."""
+  ad_effect_retention_rate: dist.Distribution
+  peak_effect_delay: dist.Distribution
+  exponent: dist.Distribution
+
+  def as_mapping(self) -> Mapping[str, Prior]:
+    return types.MappingProxyType({
+        _AD_EFFECT_RETENTION_RATE: self.ad_effect_retention_rate,
+        _PEAK_EFFECT_DELAY: self.peak_effect_delay,
+        _EXPONENT: self.exponent
+    })
+
+
+@dataclasses.dataclass(frozen=True)
+class _AdstockDefaults:
+  """Default priors of transform_adstock."""
+  exponent: dist.Distribution
+  lag_weight: dist.Distribution
+
+  def as_mapping(self) -> Mapping[str, Prior]:
+    return types.MappingProxyType({
+        _EXPONENT: self.exponent,
+        _LAG_WEIGHT: self.lag_weight
+    })
+
+
+@dataclasses.dataclass(frozen=True)
+class _HillAdstockDefaults:
+  """Default priors of transform_hill_adstock."""
+  lag_weight: dist.Distribution
+  half_max_effective_concentration: dist.Distribution
+  slope: dist.Distribution
+
+  def as_mapping(self) -> Mapping[str, Prior]:
+    return types.MappingProxyType({
+        _LAG_WEIGHT: self.lag_weight,
+        _HALF_MAX_EFFECTIVE_CONCENTRATION:
+            self.half_max_effective_concentration,
+        _SLOPE: self.slope
+    })
+
+
+@dataclasses.dataclass(frozen=True)
+class _ExponentialAdstockDefaults:
+  """Default priors of transform_exponential_adstock."""
+  lag_weight: dist.Distribution
+  slope: dist.Distribution
+
+  def as_mapping(self) -> Mapping[str, Prior]:
+    return types.MappingProxyType({
+        _LAG_WEIGHT: self.lag_weight,
+        _SLOPE: self.slope
+    })
+
+
+TransformDefaults = Union[_CarryoverDefaults, _AdstockDefaults,
+                          _HillAdstockDefaults, _ExponentialAdstockDefaults]
+
+
+@functools.lru_cache(maxsize=1)
+def _get_transform_defaults() -> Mapping[str, TransformDefaults]:
   # Since JAX cannot be called before absl.app.run in tests we get default
-  # priors from a function.
-  return immutabledict.immutabledict({
-      "carryover":
-          immutabledict.immutabledict({
-              _AD_EFFECT_RETENTION_RATE:
-                  dist.Beta(concentration1=1., concentration0=1.),
-              _PEAK_EFFECT_DELAY:
-                  dist.HalfNormal(scale=2.),
-              _EXPONENT:
-                  dist.Beta(concentration1=9., concentration0=1.)
-          }),
-      "adstock":
-          immutabledict.immutabledict({
-              _EXPONENT: dist.Beta(concentration1=9., concentration0=1.),
-              _LAG_WEIGHT: dist.Beta(concentration1=2., concentration0=1.)
-          }),
-      "hill_adstock":
-          immutabledict.immutabledict({
-              _LAG_WEIGHT:
-                  dist.Beta(concentration1=2., concentration0=1.),
-              _HALF_MAX_EFFECTIVE_CONCENTRATION:
-                  dist.Gamma(concentration=1., rate=1.),
-              _SLOPE:
-                  dist.Gamma(concentration=1., rate=1.)
-          }),
-      "exponential_adstock":
-          immutabledict.immutabledict({
-              _LAG_WEIGHT:
-                  dist.Beta(concentration1=2., concentration0=1.),
-              _SLOPE:
-                  dist.Gamma(concentration=1., rate=1.)
-          })
-  })
+  # priors from a function. The result is cached so the distributions are only
+  # built once instead of on every trace of the model. As for the model default
+  # priors, they are built with concrete arrays to not leak tracers.
+  with jax.ensure_compile_time_eval():
+    return types.MappingProxyType({
+        "carryover":
+            _CarryoverDefaults(
+                ad_effect_retention_rate=dist.Beta(
+                    concentration1=1., concentration0=1.),
+                peak_effect_delay=dist.HalfNormal(scale=2.),
+                exponent=dist.Beta(concentration1=9., concentration0=1.)),
+        "adstock":
+            _AdstockDefaults(
+                exponent=dist.Beta(concentration1=9., concentration0=1.),
+                lag_weight=dist.Beta(concentration1=2., concentration0=1.)),
+        "hill_adstock":
+            _HillAdstockDefaults(
+                lag_weight=dist.Beta(concentration1=2., concentration0=1.),
+                half_max_effective_concentration=dist.Gamma(
+                    concentration=1., rate=1.),
+                slope=dist.Gamma(concentration=1., rate=1.)),
+        "exponential_adstock":
+            _ExponentialAdstockDefaults(
+                lag_weight=dist.Beta(concentration1=2., concentration0=1.),
+                slope=dist.Gamma(concentration=1., rate=1.))
+    })
+
+
+@functools.lru_cache()
+def _get_carryover_defaults(n_channels: int) -> _CarryoverDefaults:
+  # The carryover defaults are expanded to the number of channels up front so
+  # the channel plate does not need to expand them again on every trace. Like
+  # the other cached defaults they are built with concrete arrays.
+  defaults = _get_transform_defaults()["carryover"]
+  with jax.ensure_compile_time_eval():
+    return _CarryoverDefaults(
+        ad_effect_retention_rate=defaults.ad_effect_retention_rate.expand(
+            (n_channels,)),
+        peak_effect_delay=defaults.peak_effect_delay.expand((n_channels,)),
+        exponent=defaults.exponent.expand((n_channels,)))
+
+
+def _lag_in_precision(lag_function: Callable[..., jnp.ndarray],
+                      data: jnp.ndarray,
+                      precision: str,
+                      **parameters: jnp.ndarray) -> jnp.ndarray:
+  """Applies a lag function (adstock or carryover) in the given precision.
+
+  The lag functions are bound by the memory traffic of the media data, so
+  running them in bfloat16 halves it. The result is cast back to the dtype of
+  the media data for the saturation functions and the likelihood.
+
+  Args:
+    lag_function: Lag function to apply, taking the data and the parameters
+      as keyword arguments.
+    data: Media data to apply the lag function to.
+    precision: Precision to apply the lag function in. One of the keys of
+      _PRECISION_DTYPES.
+    **parameters: Array parameters of the lag function.
+
+  Returns:
+    The lagged media data.
+  """
+  if precision == "fp32":
+    return lag_function(data=data, **parameters)
+  dtype = _PRECISION_DTYPES[precision]
+  lagged_data = lag_function(
+      data=data.astype(dtype),
+      **{name: value.astype(dtype) for name, value in parameters.items()})
+  return lagged_data.astype(data.dtype)
+
+
+@functools.partial(
+    jax.jit,
+    static_argnames=("saturation_function", "normalise", "use_remat",
+                     "precision"))
+def _adstock_numeric(
+    media_data: jnp.ndarray,
+    lag_weight: jnp.ndarray,
+    saturation_parameters: Tuple[jnp.ndarray, ...],
+    saturation_function: Callable[..., jnp.ndarray],
+    normalise: bool = True,
+    use_remat: bool = False,
+    precision: str = "fp32") -> jnp.ndarray:
+  """Applies adstock and a saturation function given sampled parameters.
+
+  All the adstock based transforms share this kernel and only differ in the
+  saturation function applied after the adstock. Since it is a static
+  argument, each of them gets its own compiled kernel.
+
+  Args:
+    media_data: Media data to be transformed.
+    lag_weight: Lag weight of the adstock function for each channel. Must
+      already broadcast against the media data.
+    saturation_parameters: Parameters of the saturation function for each
+      channel, passed positionally after the adstocked data. Must already
+      broadcast against the media data.
+    saturation_function: Function to apply to the adstocked data. Eg.
+      media_transforms.apply_exponent_safe or media_transforms.hill.
+    normalise: Whether to normalise the adstock output values.
+    use_remat: Whether to recompute the intermediate values in the backward
+      pass instead of keeping them in memory.
+    precision: Precision of the adstock, "fp32" or "bf16".
+
+  Returns:
+    The transformed media data.
+  """
+
+  def adstock_then_saturation(media_data, lag_weight, saturation_parameters):
+    adstock = _lag_in_precision(
+        functools.partial(media_transforms.adstock, normalise=normalise),
+        data=media_data,
+        precision=precision,
+        lag_weight=lag_weight)
+    return saturation_function(adstock, *saturation_parameters)
+
+  if use_remat:
+    adstock_then_saturation = jax.checkpoint(adstock_then_saturation)
+  return adstock_then_saturation(media_data, lag_weight, saturation_parameters)
+
+
+@functools.partial(
+    jax.jit, static_argnames=("number_lags", "use_remat", "precision"))
+def _carryover_numeric(media_data: jnp.ndarray,
+                       ad_effect_retention_rate: jnp.ndarray,
+                       peak_effect_delay: jnp.ndarray,
+                       exponent: jnp.ndarray,
+                       number_lags: int = 13,
+                       use_remat: bool = False,
+                       precision: str = "fp32") -> jnp.ndarray:
+  """Applies carryover and exponent to the media data given sampled parameters.
+
+  Args:
+    media_data: Media data to be transformed.
+    ad_effect_retention_rate: Retention rate of the advertisement effect for
+      each channel.
+    peak_effect_delay: Delay of the peak effect for each channel.
+    exponent: Exponent to apply after the carryover for each channel. Must
+      already broadcast against the media data.
+    number_lags: Number of lags for the carryover function. It is a static
+      argument so a single compiled kernel is reused for a given number of lags.
+    use_remat: Whether to recompute the intermediate values in the backward
+      pass instead of keeping them in memory.
+    precision: Precision of the carryover, "fp32" or "bf16".
+
+  Returns:
+    The transformed media data.
+  """
+  # The carryover weights are only cast when running in reduced precision, so
+  # in fp32 they keep the dtype of the sampled parameters.
+  weights_dtype = None if precision == "fp32" else _PRECISION_DTYPES[precision]
+
+  def carryover_then_exponent(media_data, ad_effect_retention_rate,
+                              peak_effect_delay, exponent):
+    carryover = _lag_in_precision(
+        functools.partial(
+            media_transforms.carryover,
+            number_lags=number_lags,
+            dtype=weights_dtype),
+        data=media_data,
+        precision=precision,
+        ad_effect_retention_rate=ad_effect_retention_rate,
+        peak_effect_delay=peak_effect_delay)
+    return media_transforms.apply_exponent_safe(
+        data=carryover, exponent=exponent)
+
+  if use_remat:
+    carryover_then_exponent = jax.checkpoint(carryover_then_exponent)
+  return carryover_then_exponent(media_data, ad_effect_retention_rate,
+                                 peak_effect_delay, exponent)
+
+
+def _sample_adstock_parameters(
+    media_data: jnp.ndarray,
+    custom_priors: MutableMapping[str, Prior]
+) -> Tuple[jnp.ndarray, jnp.ndarray]:
+  """Samples the lag weight and exponent of each channel for adstock."""
+  defaults = _get_transform_defaults()["adstock"]
+  lag_weight_prior = custom_priors.get(_LAG_WEIGHT, defaults.lag_weight)
+  exponent_prior = custom_priors.get(_EXPONENT, defaults.exponent)
+  with numpyro.plate(name=_CHANNEL_PLATE, size=media_data.shape[1]):
+    lag_weight = numpyro.sample(name=_LAG_WEIGHT, fn=lag_weight_prior)
+    exponent = numpyro.sample(name=_EXPONENT, fn=exponent_prior)
+  return lag_weight, exponent
+
+
+def _transform_adstock_2d(media_data: jnp.ndarray,
+                          custom_priors: MutableMapping[str, Prior],
+                          normalise: bool = True,
+                          use_remat: bool = False,
+                          precision: str = "fp32") -> jnp.ndarray:
+  """National version of transform_adstock."""
+  lag_weight, exponent = _sample_adstock_parameters(media_data, custom_priors)
+  return _adstock_numeric(
+      media_data=media_data,
+      lag_weight=lag_weight,
+      saturation_parameters=(exponent,),
+      saturation_function=media_transforms.apply_exponent_safe,
+      normalise=normalise,
+      use_remat=use_remat,
+      precision=precision)
+
+
+def _transform_adstock_3d(media_data: jnp.ndarray,
+                          custom_priors: MutableMapping[str, Prior],
+                          normalise: bool = True,
+                          use_remat: bool = False,
+                          precision: str = "fp32") -> jnp.ndarray:
+  """Geo version of transform_adstock."""
+  lag_weight, exponent = _sample_adstock_parameters(media_data, custom_priors)
+  return _adstock_numeric(
+      media_data=media_data,
+      lag_weight=lag_weight[..., None],
+      saturation_parameters=(exponent[..., None],),
+      saturation_function=media_transforms.apply_exponent_safe,
+      normalise=normalise,
+      use_remat=use_remat,
+      precision=precision)
 
 
 def transform_adstock(media_data: jnp.ndarray,
                       custom_priors: MutableMapping[str, Prior],
-                      normalise: bool = True) -> jnp.ndarray:
+                      normalise: bool = True,
+                      use_remat: bool = False,
+                      precision: str = "fp32") -> jnp.ndarray:
   """Transforms the input data with the adstock function and exponent.
 
   Args:
@@ -159,38 +431,83 @@ def transform_adstock(media_data: jnp.ndarray,
       default ones. The possible names of parameters for adstock and exponent
       are "lag_weight" and "exponent".
     normalise: Whether to normalise the output values.
+    use_remat: Whether to recompute the transformed media in the backward pass
+      instead of keeping its intermediate values in memory.
+    precision: Precision to run the adstock in, "fp32" or "bf16". The output
+      has the dtype of the media data in both cases.
 
   Returns:
     The transformed media data.
   """
-  transform_default_priors = _get_transform_default_priors()["adstock"]
-  with numpyro.plate(name=f"{_LAG_WEIGHT}_plate",
-                     size=media_data.shape[1]):
-    lag_weight = numpyro.sample(
-        name=_LAG_WEIGHT,
-        fn=custom_priors.get(_LAG_WEIGHT,
-                             transform_default_priors[_LAG_WEIGHT]))
-
-  with numpyro.plate(name=f"{_EXPONENT}_plate",
-                     size=media_data.shape[1]):
-    exponent = numpyro.sample(
-        name=_EXPONENT,
-        fn=custom_priors.get(_EXPONENT,
-                             transform_default_priors[_EXPONENT]))
-
   if media_data.ndim == 3:
-    lag_weight = jnp.expand_dims(lag_weight, axis=-1)
-    exponent = jnp.expand_dims(exponent, axis=-1)
+    return _transform_adstock_3d(media_data, custom_priors, normalise,
+                                 use_remat, precision)
+  return _transform_adstock_2d(media_data, custom_priors, normalise, use_remat,
+                               precision)
 
-  adstock = media_transforms.adstock(
-      data=media_data, lag_weight=lag_weight, normalise=normalise)
 
-  return media_transforms.apply_exponent_safe(data=adstock, exponent=exponent)
+def _sample_hill_adstock_parameters(
+    media_data: jnp.ndarray,
+    custom_priors: MutableMapping[str, Prior]
+) -> Tuple[jnp.ndarray, jnp.ndarray, jnp.ndarray]:
+  """Samples the lag weight, ec50 and slope of each channel for hill adstock."""
+  defaults = _get_transform_defaults()["hill_adstock"]
+  lag_weight_prior = custom_priors.get(_LAG_WEIGHT, defaults.lag_weight)
+  half_max_effective_concentration_prior = custom_priors.get(
+      _HALF_MAX_EFFECTIVE_CONCENTRATION,
+      defaults.half_max_effective_concentration)
+  slope_prior = custom_priors.get(_SLOPE, defaults.slope)
+  with numpyro.plate(name=_CHANNEL_PLATE, size=media_data.shape[1]):
+    lag_weight = numpyro.sample(name=_LAG_WEIGHT, fn=lag_weight_prior)
+    half_max_effective_concentration = numpyro.sample(
+        name=_HALF_MAX_EFFECTIVE_CONCENTRATION,
+        fn=half_max_effective_concentration_prior)
+    slope = numpyro.sample(name=_SLOPE, fn=slope_prior)
+  return lag_weight, half_max_effective_concentration, slope
+
+
+def _transform_hill_adstock_2d(media_data: jnp.ndarray,
+                               custom_priors: MutableMapping[str, Prior],
+                               normalise: bool = True,
+                               use_remat: bool = False,
+                               precision: str = "fp32") -> jnp.ndarray:
+  """National version of transform_hill_adstock."""
+  (lag_weight, half_max_effective_concentration,
+   slope) = _sample_hill_adstock_parameters(media_data, custom_priors)
+  return _adstock_numeric(
+      media_data=media_data,
+      lag_weight=lag_weight,
+      saturation_parameters=(half_max_effective_concentration, slope),
+      saturation_function=media_transforms.hill,
+      normalise=normalise,
+      use_remat=use_remat,
+      precision=precision)
+
+
+def _transform_hill_adstock_3d(media_data: jnp.ndarray,
+                               custom_priors: MutableMapping[str, Prior],
+                               normalise: bool = True,
+                               use_remat: bool = False,
+                               precision: str = "fp32") -> jnp.ndarray:
+  """Geo version of transform_hill_adstock."""
+  (lag_weight, half_max_effective_concentration,
+   slope) = _sample_hill_adstock_parameters(media_data, custom_priors)
+  return _adstock_numeric(
+      media_data=media_data,
+      lag_weight=lag_weight[..., None],
+      saturation_parameters=(half_max_effective_concentration[..., None],
+                             slope[..., None]),
+      saturation_function=media_transforms.hill,
+      normalise=normalise,
+      use_remat=use_remat,
+      precision=precision)
 
 
 def transform_hill_adstock(media_data: jnp.ndarray,
                            custom_priors: MutableMapping[str, Prior],
-                           normalise: bool = True) -> jnp.ndarray:
+                           normalise: bool = True,
+                           use_remat: bool = False,
+                           precision: str = "fp32") -> jnp.ndarray:
   """Transforms the input data with the adstock and hill functions.
 
   Args:
@@ -200,47 +517,78 @@ def transform_hill_adstock(media_data: jnp.ndarray,
       default ones. The possible names of parameters for hill_adstock and
       exponent are "lag_weight", "half_max_effective_concentration" and "slope".
     normalise: Whether to normalise the output values.
+    use_remat: Whether to recompute the transformed media in the backward pass
+      instead of keeping its intermediate values in memory.
+    precision: Precision to run the adstock in, "fp32" or "bf16". The output
+      has the dtype of the media data in both cases.
 
   Returns:
     The transformed media data.
   """
-  transform_default_priors = _get_transform_default_priors()["hill_adstock"]
-  with numpyro.plate(name=f"{_LAG_WEIGHT}_plate",
-                     size=media_data.shape[1]):
-    lag_weight = numpyro.sample(
-        name=_LAG_WEIGHT,
-        fn=custom_priors.get(_LAG_WEIGHT,
-                             transform_default_priors[_LAG_WEIGHT]))
-
-  with numpyro.plate(name=f"{_HALF_MAX_EFFECTIVE_CONCENTRATION}_plate",
-                     size=media_data.shape[1]):
-    half_max_effective_concentration = numpyro.sample(
-        name=_HALF_MAX_EFFECTIVE_CONCENTRATION,
-        fn=custom_priors.get(
-            _HALF_MAX_EFFECTIVE_CONCENTRATION,
-            transform_default_priors[_HALF_MAX_EFFECTIVE_CONCENTRATION]))
+  if media_data.ndim == 3:
+    return _transform_hill_adstock_3d(media_data, custom_priors, normalise,
+                                      use_remat, precision)
+  return _transform_hill_adstock_2d(media_data, custom_priors, normalise,
+                                    use_remat, precision)
 
-  with numpyro.plate(name=f"{_SLOPE}_plate",
-                     size=media_data.shape[1]):
-    slope = numpyro.sample(
-        name=_SLOPE,
-        fn=custom_priors.get(_SLOPE, transform_default_priors[_SLOPE]))
 
-  if media_data.ndim == 3:
-    lag_weight = jnp.expand_dims(lag_weight, axis=-1)
-    half_max_effective_concentration = jnp.expand_dims(
-        half_max_effective_concentration, axis=-1)
-    slope = jnp.expand_dims(slope, axis=-1)
+def _sample_exponential_adstock_parameters(
+    media_data: jnp.ndarray,
+    custom_priors: MutableMapping[str, Prior]
+) -> Tuple[jnp.ndarray, jnp.ndarray]:
+  """Samples the lag weight and slope of each channel for exp. adstock."""
+  defaults = _get_transform_defaults()["exponential_adstock"]
+  lag_weight_prior = custom_priors.get(_LAG_WEIGHT, defaults.lag_weight)
+  slope_prior = custom_priors.get(_SLOPE, defaults.slope)
+  with numpyro.plate(name=_CHANNEL_PLATE, size=media_data.shape[1]):
+    lag_weight = numpyro.sample(name=_LAG_WEIGHT, fn=lag_weight_prior)
+    slope = numpyro.sample(name=_SLOPE, fn=slope_prior)
+  return lag_weight, slope
+
+
+def _transform_exponential_adstock_2d(
+    media_data: jnp.ndarray,
+    custom_priors: MutableMapping[str, Prior],
+    normalise: bool = False,
+    use_remat: bool = False,
+    precision: str = "fp32") -> jnp.ndarray:
+  """National version of transform_exponential_adstock."""
+  lag_weight, slope = _sample_exponential_adstock_parameters(
+      media_data, custom_priors)
+  return _adstock_numeric(
+      media_data=media_data,
+      lag_weight=lag_weight,
+      saturation_parameters=(slope,),
+      saturation_function=media_transforms.exponential,
+      normalise=normalise,
+      use_remat=use_remat,
+      precision=precision)
+
+
+def _transform_exponential_adstock_3d(
+    media_data: jnp.ndarray,
+    custom_priors: MutableMapping[str, Prior],
+    normalise: bool = False,
+    use_remat: bool = False,
+    precision: str = "fp32") -> jnp.ndarray:
+  """Geo version of transform_exponential_adstock."""
+  lag_weight, slope = _sample_exponential_adstock_parameters(
+      media_data, custom_priors)
+  return _adstock_numeric(
+      media_data=media_data,
+      lag_weight=lag_weight[..., None],
+      saturation_parameters=(slope[..., None],),
+      saturation_function=media_transforms.exponential,
+      normalise=normalise,
+      use_remat=use_remat,
+      precision=precision)
 
-  return media_transforms.hill(
-      data=media_transforms.adstock(
-          data=media_data, lag_weight=lag_weight, normalise=normalise),
-      half_max_effective_concentration=half_max_effective_concentration,
-      slope=slope)
 
 def transform_exponential_adstock(media_data: jnp.ndarray,
                            custom_priors: MutableMapping[str, Prior],
-                           normalise: bool = False) -> jnp.ndarray:
+                           normalise: bool = False,
+                           use_remat: bool = False,
+                           precision: str = "fp32") -> jnp.ndarray:
   """Transforms the input data with the adstock and hill functions.
 
   Args:
@@ -250,36 +598,80 @@ def transform_exponential_adstock(media_data: jnp.ndarray,
       default ones. The possible names of parameters for hill_adstock and
       exponent are "lag_weight", "half_max_effective_concentration" and "slope".
     normalise: Whether to normalise the output values.
+    use_remat: Whether to recompute the transformed media in the backward pass
+      instead of keeping its intermediate values in memory.
+    precision: Precision to run the adstock in, "fp32" or "bf16". The output
+      has the dtype of the media data in both cases.
 
   Returns:
     The transformed media data.
   """
-  transform_default_priors = _get_transform_default_priors()["exponential_adstock"]
-  with numpyro.plate(name=f"{_LAG_WEIGHT}_plate",
-                     size=media_data.shape[1]):
-    lag_weight = numpyro.sample(
-        name=_LAG_WEIGHT,
-        fn=custom_priors.get(_LAG_WEIGHT,
-                             transform_default_priors[_LAG_WEIGHT]))
-
-  with numpyro.plate(name=f"{_SLOPE}_plate",
-                     size=media_data.shape[1]):
-    slope = numpyro.sample(
-        name=_SLOPE,
-        fn=custom_priors.get(_SLOPE, transform_default_priors[_SLOPE]))
-
   if media_data.ndim == 3:
-    lag_weight = jnp.expand_dims(lag_weight, axis=-1)
-    slope = jnp.expand_dims(slope, axis=-1)
+    return _transform_exponential_adstock_3d(
+        media_data, custom_priors, normalise, use_remat, precision)
+  return _transform_exponential_adstock_2d(media_data, custom_priors, normalise,
+                                           use_remat, precision)
+
+
+def _sample_carryover_parameters(
+    media_data: jnp.ndarray,
+    custom_priors: MutableMapping[str, Prior]
+) -> Tuple[jnp.ndarray, jnp.ndarray, jnp.ndarray]:
+  """Samples the retention rate, peak delay and exponent for carryover."""
+  defaults = _get_carryover_defaults(media_data.shape[1])
+  ad_effect_retention_rate_prior = custom_priors.get(
+      _AD_EFFECT_RETENTION_RATE, defaults.ad_effect_retention_rate)
+  peak_effect_delay_prior = custom_priors.get(_PEAK_EFFECT_DELAY,
+                                              defaults.peak_effect_delay)
+  exponent_prior = custom_priors.get(_EXPONENT, defaults.exponent)
+  with numpyro.plate(name=_CHANNEL_PLATE, size=media_data.shape[1]):
+    ad_effect_retention_rate = numpyro.sample(
+        name=_AD_EFFECT_RETENTION_RATE, fn=ad_effect_retention_rate_prior)
+    peak_effect_delay = numpyro.sample(
+        name=_PEAK_EFFECT_DELAY, fn=peak_effect_delay_prior)
+    exponent = numpyro.sample(name=_EXPONENT, fn=exponent_prior)
+  return ad_effect_retention_rate, peak_effect_delay, exponent
+
+
+def _transform_carryover_2d(media_data: jnp.ndarray,
+                            custom_priors: MutableMapping[str, Prior],
+                            number_lags: int = 13,
+                            use_remat: bool = False,
+                            precision: str = "fp32") -> jnp.ndarray:
+  """National version of transform_carryover."""
+  (ad_effect_retention_rate, peak_effect_delay,
+   exponent) = _sample_carryover_parameters(media_data, custom_priors)
+  return _carryover_numeric(media_data=media_data,
+                            ad_effect_retention_rate=ad_effect_retention_rate,
+                            peak_effect_delay=peak_effect_delay,
+                            exponent=exponent,
+                            number_lags=number_lags,
+                            use_remat=use_remat,
+                            precision=precision)
+
+
+def _transform_carryover_3d(media_data: jnp.ndarray,
+                            custom_priors: MutableMapping[str, Prior],
+                            number_lags: int = 13,
+                            use_remat: bool = False,
+                            precision: str = "fp32") -> jnp.ndarray:
+  """Geo version of transform_carryover."""
+  (ad_effect_retention_rate, peak_effect_delay,
+   exponent) = _sample_carryover_parameters(media_data, custom_priors)
+  return _carryover_numeric(media_data=media_data,
+                            ad_effect_retention_rate=ad_effect_retention_rate,
+                            peak_effect_delay=peak_effect_delay,
+                            exponent=exponent[..., None],
+                            number_lags=number_lags,
+                            use_remat=use_remat,
+                            precision=precision)
 
-  return media_transforms.exponential(
-      data=media_transforms.adstock(
-          data=media_data, lag_weight=lag_weight, normalise=normalise),
-      slope=slope)
 
 def transform_carryover(media_data: jnp.ndarray,
                         custom_priors: MutableMapping[str, Prior],
-                        number_lags: int = 13) -> jnp.ndarray:
+                        number_lags: int = 13,
+                        use_remat: bool = False,
+                        precision: str = "fp32") -> jnp.ndarray:
   """Transforms the input data with the carryover function and exponent.
 
   Args:
@@ -290,41 +682,34 @@ def transform_carryover(media_data: jnp.ndarray,
       are "ad_effect_retention_rate_plate", "peak_effect_delay_plate" and
       "exponent".
     number_lags: Number of lags for the carryover function.
+    use_remat: Whether to recompute the transformed media in the backward pass
+      instead of keeping its intermediate values in memory.
+    precision: Precision to run the carryover in, "fp32" or "bf16". The output
+      has the dtype of the media data in both cases.
 
   Returns:
     The transformed media data.
   """
-  transform_default_priors = _get_transform_default_priors()["carryover"]
-  with numpyro.plate(name=f"{_AD_EFFECT_RETENTION_RATE}_plate",
-                     size=media_data.shape[1]):
-    ad_effect_retention_rate = numpyro.sample(
-        name=_AD_EFFECT_RETENTION_RATE,
-        fn=custom_priors.get(
-            _AD_EFFECT_RETENTION_RATE,
-            transform_default_priors[_AD_EFFECT_RETENTION_RATE]))
-
-  with numpyro.plate(name=f"{_PEAK_EFFECT_DELAY}_plate",
-                     size=media_data.shape[1]):
-    peak_effect_delay = numpyro.sample(
-        name=_PEAK_EFFECT_DELAY,
-        fn=custom_priors.get(
-            _PEAK_EFFECT_DELAY, transform_default_priors[_PEAK_EFFECT_DELAY]))
-
-  with numpyro.plate(name=f"{_EXPONENT}_plate",
-                     size=media_data.shape[1]):
-    exponent = numpyro.sample(
-        name=_EXPONENT,
-        fn=custom_priors.get(_EXPONENT,
-                             transform_default_priors[_EXPONENT]))
-  carryover = media_transforms.carryover(
-      data=media_data,
-      ad_effect_retention_rate=ad_effect_retention_rate,
-      peak_effect_delay=peak_effect_delay,
-      number_lags=number_lags)
-
   if media_data.ndim == 3:
-    exponent = jnp.expand_dims(exponent, axis=-1)
-  return media_transforms.apply_exponent_safe(data=carryover, exponent=exponent)
+    return _transform_carryover_3d(media_data, custom_priors, number_lags,
+                                   use_remat, precision)
+  return _transform_carryover_2d(media_data, custom_priors, number_lags,
+                                 use_remat, precision)
+
+
+# National (2 dims) and geo (3 dims) versions of the built-in transforms. The
+# model picks the right one once from the media data dims so that the traced
+# path does not branch on the shape of the data.
+_TRANSFORM_SPECIALIZATIONS = types.MappingProxyType({
+    (transform_adstock, 2): _transform_adstock_2d,
+    (transform_adstock, 3): _transform_adstock_3d,
+    (transform_hill_adstock, 2): _transform_hill_adstock_2d,
+    (transform_hill_adstock, 3): _transform_hill_adstock_3d,
+    (transform_exponential_adstock, 2): _transform_exponential_adstock_2d,
+    (transform_exponential_adstock, 3): _transform_exponential_adstock_3d,
+    (transform_carryover, 2): _transform_carryover_2d,
+    (transform_carryover, 3): _transform_carryover_3d,
+})
 
 
 def media_mix_model(
@@ -338,14 +723,24 @@ def media_mix_model(
     custom_priors: MutableMapping[str, Prior],
     transform_kwargs: Optional[MutableMapping[str, Any]] = None,
     weekday_seasonality: bool = False,
-    extra_features: Optional[jnp.array] = None
+    extra_features: Optional[jnp.array] = None,
+    use_remat: bool = False,
+    precision: str = "fp32"
     ) -> None:
   """Media mix model.
 
+  All shapes used in the model are taken from the static shapes of the inputs
+  and every branch on them (national vs geo, extra features, weekday
+  seasonality) is a Python level branch resolved while tracing. The traced
+  model is therefore free of data dependent control flow and safe to vmap,
+  which allows running it with numpyro.infer.MCMC(chain_method="vectorized")
+  so all chains share a single trace and compilation.
+
   Args:
     media_data: Media data to be be used in the model.
     target_data: Target data for the model.
     media_prior: Cost prior for each of the media channels.
+    media_sigma: Standard deviation of the prior of each media coefficient.
     degrees_seasonality: Number of degrees of seasonality to use.
     frequency: Frequency of the time span which was used to aggregate the data.
       Eg. if weekly data then frequency is 52.
@@ -361,25 +756,51 @@ def media_mix_model(
     weekday_seasonality: In case of daily data you can estimate a weekday (7)
       parameter.
     extra_features: Extra features data to include in the model.
+    use_remat: Whether the media transform recomputes its intermediate values
+      in the backward pass instead of keeping them in memory. Trades compute
+      for memory, which can help fitting large geo models. Only supported by
+      the built-in transform functions.
+    precision: Precision to run the lag functions (adstock and carryover) of
+      the media transform in. Either "fp32" or "bf16". With "bf16" the lagged
+      media is cast back to the dtype of the media data before the saturation
+      and the likelihood.
+      Only supported by the built-in transform functions.
+
+  Raises:
+    ValueError: If the precision is not supported or if use_remat or a
+      precision other than "fp32" is set with a custom transform function.
   """
   default_priors = _get_default_priors()
   data_size = media_data.shape[0]
   n_channels = media_data.shape[1]
   geo_shape = (media_data.shape[2],) if media_data.ndim == 3 else ()
   n_geos = media_data.shape[2] if media_data.ndim == 3 else 1
-
-  with numpyro.plate(name=f"{_INTERCEPT}_plate", size=n_geos):
+  # Built-in transforms are resolved once to their national or geo version,
+  # custom transform functions are used as given.
+  transform = _TRANSFORM_SPECIALIZATIONS.get(
+      (transform_function, media_data.ndim), transform_function)
+  if precision not in _PRECISION_DTYPES:
+    raise ValueError(f"Precision {precision} not supported. Please use any of "
+                     f"{tuple(_PRECISION_DTYPES.keys())}.")
+  if use_remat:
+    if transform is transform_function:
+      raise ValueError("use_remat is only supported by the built-in transform "
+                       "functions.")
+    transform_kwargs = {**(transform_kwargs or {}), "use_remat": True}
+  if precision != "fp32":
+    if transform is transform_function:
+      raise ValueError("Precisions other than fp32 are only supported by the "
+                       "built-in transform functions.")
+    transform_kwargs = {**(transform_kwargs or {}), "precision": precision}
+
+  with numpyro.plate(name=_GEO_PLATE, size=n_geos):
     intercept = numpyro.sample(
         name=_INTERCEPT,
         fn=custom_priors.get(_INTERCEPT, default_priors[_INTERCEPT]))
-
-  with numpyro.plate(name=f"{_SIGMA}_plate", size=n_geos):
     sigma = numpyro.sample(
         name=_SIGMA,
         fn=custom_priors.get(_SIGMA, default_priors[_SIGMA]))
-
-  # TODO(): Force all geos to have the same trend sign.
-  with numpyro.plate(name=f"{_COEF_TREND}_plate", size=n_geos):
+    # TODO(): Force all geos to have the same trend sign.
     coef_trend = numpyro.sample(
         name=_COEF_TREND,
         fn=custom_priors.get(_COEF_TREND, default_priors[_COEF_TREND]))
@@ -390,45 +811,42 @@ def media_mix_model(
           _EXPO_TREND, default_priors[_EXPO_TREND]))
 
   with numpyro.plate(
-      name="channel_media_plate",
+      name=_CHANNEL_MEDIA_PLATE,
       size=n_channels,
       dim=-2 if media_data.ndim == 3 else -1):
-    coef_media = numpyro.sample(
-        name="channel_coef_media" if media_data.ndim == 3 else "coef_media",
-        fn=dist.Normal(loc=media_prior, scale=media_sigma))
     if media_data.ndim == 3:
       with numpyro.plate(
-          name="geo_media_plate",
+          name=_GEO_MEDIA_PLATE,
           size=n_geos,
           dim=-1):
         coef_media = numpyro.sample(
-            name="coef_media", fn=dist.Normal(loc=media_prior, scale=media_sigma))
-
-  with numpyro.plate(name=f"{_GAMMA_SEASONALITY}_sin_cos_plate", size=2):
-    with numpyro.plate(name=f"{_GAMMA_SEASONALITY}_plate",
+            name="coef_media",
+            fn=dist.Normal(loc=media_prior, scale=media_sigma))
+    else:
+      coef_media = numpyro.sample(
+          name="coef_media", fn=dist.Normal(loc=media_prior, scale=media_sigma))
+
+  with numpyro.plate(name=_GAMMA_SEASONALITY_SIN_COS_PLATE, size=2):
+    with numpyro.plate(name=_GAMMA_SEASONALITY_PLATE,
                        size=degrees_seasonality):
       gamma_seasonality = numpyro.sample(
           name=_GAMMA_SEASONALITY,
           fn=custom_priors.get(
               _GAMMA_SEASONALITY, default_priors[_GAMMA_SEASONALITY]))
 
+  weekday_series = 0.
   if weekday_seasonality:
-    with numpyro.plate(name=f"{_WEEKDAY}_plate", size=7):
+    with numpyro.plate(name=_WEEKDAY_PLATE, size=7):
       weekday = numpyro.sample(
           name=_WEEKDAY,
           fn=custom_priors.get(_WEEKDAY, default_priors[_WEEKDAY]))
     weekday_series = weekday[jnp.arange(data_size) % 7]
-    # In case of daily data, number of lags should be 13*7.
-    if transform_function == "carryover" and transform_kwargs and "number_lags" not in transform_kwargs:
-      transform_kwargs["number_lags"] = 13 * 7
-    elif transform_function == "carryover" and not transform_kwargs:
-      transform_kwargs = {"number_lags": 13 * 7}
 
   media_transformed = numpyro.deterministic(
       name="media_transformed",
-      value=transform_function(media_data,
-                               custom_priors=custom_priors,
-                               **transform_kwargs if transform_kwargs else {}))
+      value=transform(media_data,
+                      custom_priors=custom_priors,
+                      **transform_kwargs if transform_kwargs else {}))
   seasonality = media_transforms.calculate_seasonality(
       number_periods=data_size,
       degrees=degrees_seasonality,
@@ -436,33 +854,32 @@ def media_mix_model(
       gamma_seasonality=gamma_seasonality)
   # For national model's case
   trend = jnp.arange(data_size)
-  media_einsum = "tc, c -> t"  # t = time, c = channel
   coef_seasonality = 1
 
   # TODO(): Add conversion of prior for HalfNormal distribution.
   if media_data.ndim == 3:  # For geo model's case
     trend = jnp.expand_dims(trend, axis=-1)
     seasonality = jnp.expand_dims(seasonality, axis=-1)
-    media_einsum = "tcg, cg -> tg"  # t = time, c = channel, g = geo
     if weekday_seasonality:
       weekday_series = jnp.expand_dims(weekday_series, axis=-1)
-    with numpyro.plate(name="seasonality_plate", size=n_geos):
+    with numpyro.plate(name=_SEASONALITY_PLATE, size=n_geos):
       coef_seasonality = numpyro.sample(
           name=_COEF_SEASONALITY,
           fn=custom_priors.get(
               _COEF_SEASONALITY, default_priors[_COEF_SEASONALITY]))
-  # expo_trend is B(1, 1) so that the exponent on time is in [.5, 1.5].
-  prediction = (
-      intercept + coef_trend * trend ** expo_trend +
-      seasonality * coef_seasonality +
-      jnp.einsum(media_einsum, media_transformed, coef_media))
+  if media_data.ndim == 3:
+    # (time, channel, geo) x (channel, geo) -> (time, geo)
+    media_effect = (media_transformed * coef_media).sum(axis=1)
+  else:
+    # (time, channel) x (channel,) -> (time,)
+    media_effect = media_transformed @ coef_media
+
+  extra_features_effect = 0.
   if extra_features is not None:
     plate_prefixes = ("extra_feature",)
-    extra_features_einsum = "tf, f -> t"  # t = time, f = feature
     extra_features_plates_shape = (extra_features.shape[1],)
     if extra_features.ndim == 3:
       plate_prefixes = ("extra_feature", "geo")
-      extra_features_einsum = "tfg, fg -> tg"  # t = time, f = feature, g = geo
       extra_features_plates_shape = (extra_features.shape[1], *geo_shape)
     with numpyro.plate_stack(plate_prefixes,
                              sizes=extra_features_plates_shape):
@@ -470,14 +887,21 @@ def media_mix_model(
           name=_COEF_EXTRA_FEATURES,
           fn=custom_priors.get(
               _COEF_EXTRA_FEATURES, default_priors[_COEF_EXTRA_FEATURES]))
-    extra_features_effect = jnp.einsum(extra_features_einsum,
-                                       extra_features,
-                                       coef_extra_features)
-    prediction += extra_features_effect
+    if extra_features.ndim == 3:
+      # (time, feature, geo) x (feature, geo) -> (time, geo)
+      extra_features_effect = (
+          extra_features * coef_extra_features).sum(axis=1)
+    else:
+      # (time, feature) x (feature,) -> (time,)
+      extra_features_effect = extra_features @ coef_extra_features
 
-  if weekday_seasonality:
-    prediction += weekday_series
+  # expo_trend is B(1, 1) so that the exponent on time is in [.5, 1.5].
+  prediction = (
+      intercept + coef_trend * trend ** expo_trend +
+      seasonality * coef_seasonality + media_effect + extra_features_effect +
+      weekday_series)
   mu = numpyro.deterministic(name="mu", value=prediction)
 
-  numpyro.sample(
-      name="target", fn=dist.Normal(loc=mu, scale=sigma), obs=target_data)
+  # The observed site is kept as a sample (rather than a numpyro.factor) since
+  # posterior predictive runs call the model with target_data=None.
+  numpyro.sample(name="target", fn=dist.Normal(mu, sigma), obs=target_data)
@@ -14,14 +14,18 @@
 
 """Tests for models."""
 
+import dataclasses
+
 from absl.testing import absltest
 from absl.testing import parameterized
 import jax
+from jax import experimental
 import jax.numpy as jnp
 import numpyro
 from numpyro import distributions as dist
 from numpyro import handlers
 
+from lightweight_mmm import media_transforms
 from lightweight_mmm import models
 
 
@@ -169,6 +173,342 @@ class ModelsTest(parameterized.TestCase):
                      (degrees, 2))
     self.assertEqual(trace["mu"].mean(axis=0).shape, target_shape)
 
+  @parameterized.named_parameters(
+      dict(
+          testcase_name="national",
+          media_shape=(10, 3),
+          target_shape=(10,),
+          total_costs_shape=(3,)),
+      dict(
+          testcase_name="geo",
+          media_shape=(10, 3, 2),
+          target_shape=(10, 2),
+          total_costs_shape=(3, 1)))
+  def test_media_mix_model_runs_with_vectorized_chains(
+      self, media_shape, target_shape, total_costs_shape):
+    kernel = numpyro.infer.NUTS(model=models.media_mix_model)
+    mcmc = numpyro.infer.MCMC(
+        sampler=kernel,
+        num_warmup=5,
+        num_samples=5,
+        num_chains=2,
+        chain_method="vectorized",
+        progress_bar=False)
+
+    mcmc.run(
+        jax.random.PRNGKey(0),
+        media_data=jnp.ones(media_shape),
+        target_data=jnp.ones(target_shape),
+        media_prior=jnp.ones(total_costs_shape),
+        media_sigma=jnp.ones(total_costs_shape),
+        degrees_seasonality=2,
+        custom_priors={},
+        frequency=52,
+        transform_function=models.transform_adstock)
+
+    self.assertEqual(mcmc.get_samples(group_by_chain=True)["mu"].shape,
+                     (2, 5, *target_shape))
+
+  @parameterized.named_parameters(
+      dict(
+          testcase_name="adstock_national",
+          transform_function=models.transform_adstock,
+          shape=(10, 3)),
+      dict(
+          testcase_name="adstock_geo",
+          transform_function=models.transform_adstock,
+          shape=(10, 3, 2)),
+      dict(
+          testcase_name="hill_adstock_national",
+          transform_function=models.transform_hill_adstock,
+          shape=(10, 3)),
+      dict(
+          testcase_name="hill_adstock_geo",
+          transform_function=models.transform_hill_adstock,
+          shape=(10, 3, 2)),
+      dict(
+          testcase_name="exponential_adstock_national",
+          transform_function=models.transform_exponential_adstock,
+          shape=(10, 3)),
+      dict(
+          testcase_name="exponential_adstock_geo",
+          transform_function=models.transform_exponential_adstock,
+          shape=(10, 3, 2)),
+      dict(
+          testcase_name="carryover_national",
+          transform_function=models.transform_carryover,
+          shape=(10, 3)),
+      dict(
+          testcase_name="carryover_geo",
+          transform_function=models.transform_carryover,
+          shape=(10, 3, 2)))
+  def test_transform_specializations_match_transform_function(
+      self, transform_function, shape):
+    media = jnp.arange(jnp.prod(jnp.array(shape)), dtype=jnp.float32).reshape(
+        shape)
+    specialized_function = models._TRANSFORM_SPECIALIZATIONS[(
+        transform_function, len(shape))]
+
+    expected = handlers.seed(transform_function, rng_seed=0)(
+        media, custom_priors={})
+    transformed_media = handlers.seed(specialized_function, rng_seed=0)(
+        media, custom_priors={})
+
+    self.assertEqual(transformed_media.shape, shape)
+    self.assertTrue(jnp.allclose(transformed_media, expected))
+
+  def test_media_mix_model_uses_custom_transform_function_as_given(self):
+
+    def custom_transform(media_data, custom_priors, scale=1.):
+      del custom_priors
+      return media_data * scale
+
+    trace = handlers.trace(handlers.seed(
+        models.media_mix_model, rng_seed=0)).get_trace(
+            media_data=jnp.ones((10, 3)),
+            target_data=jnp.ones(10),
+            media_prior=jnp.ones(3),
+            media_sigma=jnp.ones(3),
+            degrees_seasonality=2,
+            frequency=52,
+            transform_function=custom_transform,
+            custom_priors={},
+            transform_kwargs={"scale": 2.})
+
+    self.assertTrue(
+        jnp.array_equal(trace["media_transformed"]["value"],
+                        jnp.full((10, 3), 2.)))
+
+  @parameterized.named_parameters(
+      dict(
+          testcase_name="adstock",
+          transform_function=models.transform_adstock),
+      dict(
+          testcase_name="hill_adstock",
+          transform_function=models.transform_hill_adstock),
+      dict(
+          testcase_name="exponential_adstock",
+          transform_function=models.transform_exponential_adstock),
+      dict(
+          testcase_name="carryover",
+          transform_function=models.transform_carryover))
+  def test_transform_with_remat_produces_same_values_and_gradients(
+      self, transform_function):
+
+    def transformed_media_sum(media, use_remat):
+      return handlers.seed(transform_function, rng_seed=0)(
+          media, custom_priors={}, use_remat=use_remat).sum()
+
+    media = jnp.arange(60, dtype=jnp.float32).reshape((10, 3, 2))
+
+    expected_value, expected_grads = jax.value_and_grad(transformed_media_sum)(
+        media, False)
+    value, grads = jax.value_and_grad(transformed_media_sum)(media, True)
+
+    self.assertTrue(jnp.allclose(value, expected_value))
+    self.assertTrue(jnp.allclose(grads, expected_grads))
+
+  @parameterized.named_parameters(
+      dict(
+          testcase_name="adstock",
+          transform_function=models.transform_adstock),
+      dict(
+          testcase_name="hill_adstock",
+          transform_function=models.transform_hill_adstock),
+      dict(
+          testcase_name="exponential_adstock",
+          transform_function=models.transform_exponential_adstock),
+      dict(
+          testcase_name="carryover",
+          transform_function=models.transform_carryover))
+  def test_transform_in_bf16_returns_float32_close_to_fp32(
+      self, transform_function):
+    media = jnp.arange(60, dtype=jnp.float32).reshape((10, 3, 2)) % 7
+
+    expected = handlers.seed(transform_function, rng_seed=0)(
+        media, custom_priors={})
+    transformed_media = handlers.seed(transform_function, rng_seed=0)(
+        media, custom_priors={}, precision="bf16")
+
+    self.assertEqual(transformed_media.dtype, jnp.float32)
+    self.assertTrue(
+        jnp.allclose(transformed_media, expected, rtol=5e-2, atol=5e-2))
+
+  def test_carryover_in_bf16_returns_dtype_of_float64_media(self):
+    with experimental.enable_x64():
+      media = jnp.arange(60, dtype=jnp.float64).reshape((20, 3)) % 7
+
+      transformed_media = models._carryover_numeric(
+          media,
+          ad_effect_retention_rate=jnp.full(3, .5, dtype=jnp.float64),
+          peak_effect_delay=jnp.ones(3, dtype=jnp.float64),
+          exponent=jnp.ones(3, dtype=jnp.float64),
+          precision="bf16")
+
+    self.assertEqual(transformed_media.dtype, jnp.float64)
+
+  def test_media_mix_model_not_supported_precision_raises_error(self):
+    with self.assertRaises(ValueError):
+      handlers.seed(models.media_mix_model, rng_seed=0)(
+          media_data=jnp.ones((10, 3)),
+          target_data=jnp.ones(10),
+          media_prior=jnp.ones(3),
+          media_sigma=jnp.ones(3),
+          degrees_seasonality=2,
+          frequency=52,
+          transform_function=models.transform_adstock,
+          custom_priors={},
+          precision="fp16")
+
+  def test_media_mix_model_use_remat_with_custom_transform_raises_error(self):
+
+    def custom_transform(media_data, custom_priors):
+      del custom_priors
+      return media_data
+
+    with self.assertRaises(ValueError):
+      handlers.seed(models.media_mix_model, rng_seed=0)(
+          media_data=jnp.ones((10, 3)),
+          target_data=jnp.ones(10),
+          media_prior=jnp.ones(3),
+          media_sigma=jnp.ones(3),
+          degrees_seasonality=2,
+          frequency=52,
+          transform_function=custom_transform,
+          custom_priors={},
+          use_remat=True)
+
+  def test_default_priors_are_built_once(self):
+    self.assertIs(models._get_default_priors(), models._get_default_priors())
+    self.assertIs(models._get_transform_defaults(),
+                  models._get_transform_defaults())
+
+  def test_adstock_numeric_matches_adstock_then_saturation_function(self):
+    media = jnp.arange(60, dtype=jnp.float32).reshape((20, 3))
+    lag_weight = jnp.array([0.2, 0.5, 0.9])
+    half_max_effective_concentration = jnp.array([1., 2., 3.])
+    slope = jnp.array([0.5, 1., 2.])
+    expected = media_transforms.hill(
+        data=media_transforms.adstock(data=media, lag_weight=lag_weight),
+        half_max_effective_concentration=half_max_effective_concentration,
+        slope=slope)
+
+    transformed_media = models._adstock_numeric(
+        media_data=media,
+        lag_weight=lag_weight,
+        saturation_parameters=(half_max_effective_concentration, slope),
+        saturation_function=media_transforms.hill)
+
+    self.assertTrue(jnp.allclose(transformed_media, expected))
+
+  def test_carryover_numeric_matches_carryover_then_exponent(self):
+    media = jnp.arange(60, dtype=jnp.float32).reshape((20, 3))
+    ad_effect_retention_rate = jnp.array([0.2, 0.5, 0.9])
+    peak_effect_delay = jnp.array([0., 1., 2.])
+    exponent = jnp.array([0.3, 0.6, 0.9])
+    expected = media_transforms.apply_exponent_safe(
+        data=media_transforms.carryover(
+            data=media,
+            ad_effect_retention_rate=ad_effect_retention_rate,
+            peak_effect_delay=peak_effect_delay,
+            number_lags=5),
+        exponent=exponent)
+
+    transformed_media = models._carryover_numeric(
+        media_data=media,
+        ad_effect_retention_rate=ad_effect_retention_rate,
+        peak_effect_delay=peak_effect_delay,
+        exponent=exponent,
+        number_lags=5)
+
+    self.assertTrue(jnp.allclose(transformed_media, expected))
+
+  def test_carryover_defaults_are_expanded_to_channels(self):
+    defaults = models._get_carryover_defaults(4)
+
+    self.assertIs(defaults, models._get_carryover_defaults(4))
+    self.assertEqual(defaults.ad_effect_retention_rate.batch_shape, (4,))
+    self.assertEqual(defaults.peak_effect_delay.batch_shape, (4,))
+    self.assertEqual(defaults.exponent.batch_shape, (4,))
+
+  @parameterized.parameters("carryover", "adstock", "hill_adstock",
+                            "exponential_adstock")
+  def test_transform_default_priors_match_transform_prior_names(
+      self, transform_name):
+    defaults = models._get_transform_defaults()[transform_name]
+    default_priors = defaults.as_mapping()
+
+    self.assertEqual(set(default_priors),
+                     models.TRANSFORM_PRIORS_NAMES[transform_name])
+    for prior_name, prior in default_priors.items():
+      self.assertIs(prior, getattr(defaults, prior_name))
+
+  def test_transform_defaults_first_built_under_jit_hold_concrete_arrays(self):
+    models._get_transform_defaults.cache_clear()
+    models._get_carryover_defaults.cache_clear()
+
+    @jax.jit
+    def build_defaults(media_data):
+      models._get_transform_defaults()
+      models._get_carryover_defaults(media_data.shape[1])
+      return media_data
+
+    build_defaults(jnp.ones((10, 3)))
+    all_defaults = [
+        *models._get_transform_defaults().values(),
+        models._get_carryover_defaults(3)
+    ]
+
+    for defaults in all_defaults:
+      for field in dataclasses.fields(defaults):
+        for leaf in jax.tree_util.tree_leaves(getattr(defaults, field.name)):
+          self.assertNotIsInstance(leaf, jax.core.Tracer)
+
+  @parameterized.named_parameters(
+      dict(
+          testcase_name="adstock",
+          transform_function=models.transform_adstock),
+      dict(
+          testcase_name="hill_adstock",
+          transform_function=models.transform_hill_adstock),
+      dict(
+          testcase_name="exponential_adstock",
+          transform_function=models.transform_exponential_adstock),
+      dict(
+          testcase_name="carryover",
+          transform_function=models.transform_carryover))
+  def test_media_mix_model_traced_under_jit_first_does_not_leak_tracers(
+      self, transform_function):
+    # Default priors are cached, so they must not keep the tracers of the
+    # first trace of the model when it happens under jax.jit.
+    models._get_default_priors.cache_clear()
+    models._get_transform_defaults.cache_clear()
+    models._get_carryover_defaults.cache_clear()
+    model_kwargs = dict(
+        media_data=jnp.ones((10, 3)),
+        media_prior=jnp.ones(3),
+        media_sigma=jnp.ones(3),
+        degrees_seasonality=2,
+        frequency=52,
+        transform_function=transform_function,
+        custom_priors={})
+
+    @jax.jit
+    def predict(rng_key):
+      return numpyro.infer.Predictive(
+          model=models.media_mix_model, num_samples=2)(
+              rng_key, target_data=None, **model_kwargs)["mu"]
+
+    predict(jax.random.PRNGKey(0))
+    mcmc = numpyro.infer.MCMC(
+        sampler=numpyro.infer.NUTS(model=models.media_mix_model),
+        num_warmup=2,
+        num_samples=2,
+        progress_bar=False)
+    mcmc.run(jax.random.PRNGKey(1), target_data=jnp.ones(10), **model_kwargs)
+
+    self.assertEqual(mcmc.get_samples()["mu"].shape, (2, 10))
+
   @parameterized.named_parameters(
       dict(
           testcase_name=f"model_{models._INTERCEPT}",
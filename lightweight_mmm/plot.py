@@ -956,7 +956,6 @@ def _make_prior_and_posterior_subplot_for_one_feature(
     fig: matplotlib.figure.Figure,
     gridspec_fig: matplotlib.gridspec.GridSpec,
     i_ax: int,
-    hyperprior: bool = False,
     number_of_samples_for_prior: int = 5000,
     kde_bandwidth_adjust_for_posterior: float = 1,
     seed: Optional[int] = None,
@@ -989,10 +988,6 @@ def _make_prior_and_posterior_subplot_for_one_feature(
     fig: The matplotlib Figure object for the overall plot.
     gridspec_fig: The matplotlib GridSpec object for the overall plot.
     i_ax: Index of the subplot within the gridspec_fig.
-    hyperprior: Flag which indicates that the prior_distribution is actually a
-      hyperprior distribution. LMMM is hierarchical on the channel coefficients
-      when run at the geo-level, so this should currently only be set to True
-      when working with the media channel coefficients.
     number_of_samples_for_prior: Controls the level of smoothing for the plotted
       version of the prior distribution. The default should be fine unless you
       want to decrease it to speed up runtime.
@@ -1028,15 +1023,6 @@ def _make_prior_and_posterior_subplot_for_one_feature(
   else:
     clipping_bounds = None
 
-  if hyperprior:
-    square_root_of_number_of_samples_for_prior = int(
-        np.sqrt(number_of_samples_for_prior))
-    prior_distribution = numpyro.distributions.continuous.HalfNormal(
-        scale=prior_samples[:square_root_of_number_of_samples_for_prior])
-    prior_samples = prior_distribution.sample(
-        key=jax.random.PRNGKey(seed=seed),
-        sample_shape=(square_root_of_number_of_samples_for_prior,)).flatten()
-
   ax = fig.add_subplot(gridspec_fig[i_ax, 0])
   sns.kdeplot(
       data=prior_samples,
@@ -1105,9 +1091,7 @@ def _collect_features_for_prior_posterior_plot(
     features = features.difference(["weekday"])
   if media_mix_model.media.ndim == 2:
     features = features.difference(models.GEO_ONLY_PRIORS)
-    features = features.union(["coef_media"])
-  else:
-    features = features.union(["coef_media", "channel_coef_media"])
+  features = features.union(["coef_media"])
 
   geo_level_features = [
       models._COEF_EXTRA_FEATURES,
@@ -1123,7 +1107,6 @@ def _collect_features_for_prior_posterior_plot(
       models._LAG_WEIGHT,
       models._PEAK_EFFECT_DELAY,
       models._SLOPE,
-      "channel_coef_media",
       "coef_media",
   ]
   seasonal_features = [models._GAMMA_SEASONALITY]
@@ -1186,7 +1169,8 @@ def plot_prior_and_posterior(
 
   default_priors = {
       **models._get_default_priors(),
-      **models._get_transform_default_priors()[media_mix_model.model_name]
+      **models._get_transform_defaults()[
+          media_mix_model.model_name].as_mapping()
   }
 
   kwargs_for_helper_function = {
@@ -1209,7 +1193,7 @@ def plot_prior_and_posterior(
         raise ValueError(f"{feature} cannot be plotted.")
     elif feature in default_priors.keys():
       prior_distribution = default_priors[feature]
-    elif feature in ("channel_coef_media", "coef_media"):
+    elif feature == "coef_media":
       # We have to fill this in later since the prior varies by channel.
       prior_distribution = None
     else:
@@ -1231,19 +1215,17 @@ def plot_prior_and_posterior(
     if feature in channel_level_features:
       for i_channel in range(media_mix_model.n_media_channels):
         subplot_title = f"{feature}, channel {i_channel}"
-        if feature in ("channel_coef_media", "coef_media"):
+        if feature == "coef_media":
           prior_distribution = numpyro.distributions.continuous.HalfNormal(
               scale=jnp.squeeze(media_mix_model._media_prior[i_channel]))
         posterior_samples = np.array(
             jnp.squeeze(media_mix_model.trace[feature][:, i_channel]))
         kwargs_for_helper_function["prior_distribution"] = prior_distribution
-        hyperprior = feature == "channel_coef_media"
         (fig, gridspec_fig,
          i_ax) = _make_prior_and_posterior_subplot_for_one_feature(
              posterior_samples=posterior_samples,
              subplot_title=subplot_title,
              i_ax=i_ax,
-             hyperprior=hyperprior,
              **kwargs_for_helper_function)
 
     if feature in seasonal_features:
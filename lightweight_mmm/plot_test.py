@@ -486,7 +486,7 @@ class PlotTest(parameterized.TestCase):
           testcase_name="carryover_geo_model",
           model_name="carryover",
           is_geo_model=True,
-          expected_number_of_subplots=45),
+          expected_number_of_subplots=40),
       dict(
           testcase_name="adstock_national_model",
           model_name="adstock",
@@ -496,7 +496,7 @@ class PlotTest(parameterized.TestCase):
           testcase_name="adstock_geo_model",
           model_name="adstock",
           is_geo_model=True,
-          expected_number_of_subplots=40),
+          expected_number_of_subplots=35),
       dict(
           testcase_name="hill_adstock_national_model",
           model_name="hill_adstock",
@@ -506,7 +506,7 @@ class PlotTest(parameterized.TestCase):
           testcase_name="hill_adstock_geo_model",
           model_name="hill_adstock",
           is_geo_model=True,
-          expected_number_of_subplots=45),
+          expected_number_of_subplots=40),
   ])
   def test_prior_posterior_plot_makes_correct_number_of_subplots(
       self, model_name, is_geo_model, expected_number_of_subplots):